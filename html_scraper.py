@@ -3,81 +3,158 @@
 html_scraper.py
 ──────────────────────────────────────────────────────────────
 Downloads the SSC notice-board HTML through a rotating Indian
-proxy, then extracts all fresh notices with BeautifulSoup.
+proxy, then extracts all fresh notices with lxml XPath.
 """
 
-import re, logging, requests
-from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
-from dateutil.parser import parse as dtparse
-from proxy_pool import get as pick_proxy, ban as ban_proxy
+import re, logging, threading, requests
+import lxml.html
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from lxml.etree import XPath
+from datetime import date, datetime, timedelta
+from notice import MONTHS, Notice, make_id
+from proxy_pool import get as pick_proxy, ban as ban_proxy, report_success
 
 MAIN_SSC_URL  = "https://ssc.gov.in/home/notice-board"
 LOOKBACK_DAYS = 12
+RACE_WIDTH    = 3      # proxies tried in parallel
+MAX_SESSIONS  = 16     # per-proxy sessions kept open at once
 
 DATE_RE   = re.compile(r"([A-Za-z]{3})\s+(\d{1,2})\s+(\d{4})")
 HEADERS   = {"User-Agent": "Mozilla/5.0"}
 
+def _cls(name: str) -> str:
+    """XPath predicate matching one token of the class attribute."""
+    return f"contains(concat(' ',normalize-space(@class),' '),' {name} ')"
+
+# compiled once; same matches as the old CSS selectors
+_XP_ROWS  = XPath(f"//div[{_cls('flex')}]")
+_XP_LEFT  = XPath(f"(.//div[{_cls('leftSection')}])[1]")
+_XP_TITLE = XPath(f"(.//div[{_cls('rightSection')}]//p[{_cls('text')}])[1]")
+_XP_PDF   = XPath(f"(.//div[{_cls('rightSection')}]//a"
+                  f"[substring(@href, string-length(@href)-3)='.pdf'])[1]/@href")
+
+# proxy → tunneled session, least recently used first
+_SESSIONS: OrderedDict[str, requests.Session] = OrderedDict()
+_SESSIONS_LOCK = threading.Lock()   # racing workers share the cache
+
 # ── internal helpers ─────────────────────────────────────────
+def _session_for(proxy: str) -> requests.Session:
+    """Return a keep-alive session bound to `proxy`, creating it once and
+    closing the least recently used one beyond `MAX_SESSIONS`."""
+    with _SESSIONS_LOCK:
+        s = _SESSIONS.get(proxy)
+        if s is not None:
+            _SESSIONS.move_to_end(proxy)
+            return s
+        s = _SESSIONS[proxy] = requests.Session()
+        s.headers.update(HEADERS)
+        evicted = (_SESSIONS.popitem(last=False)[1]
+                   if len(_SESSIONS) > MAX_SESSIONS else None)
+    if evicted:
+        evicted.close()
+    return s
+
+
+def _drop_proxy(proxy: str):
+    """Report a failure of `proxy`; close its pooled connections once it
+    has actually left the pool."""
+    if not ban_proxy(proxy):
+        return
+    with _SESSIONS_LOCK:
+        s = _SESSIONS.pop(proxy, None)
+    if s:
+        s.close()
+
+
+def _get_via(proxy: str) -> str:
+    """Fetch the notice board through `proxy`; raise on any failure."""
+    resp = _session_for(proxy).get(MAIN_SSC_URL, timeout=15,
+                                   proxies={"http": proxy, "https": proxy})
+    resp.raise_for_status()
+    return resp.text
+
+
 def _fetch_html(max_tries: int = 8) -> str | None:
-    """Return raw HTML, trying up to `max_tries` proxies."""
-    for _ in range(max_tries):
-        proxy = pick_proxy()
-        if not proxy:
-            break
-        try:
-            resp = requests.get(MAIN_SSC_URL, headers=HEADERS, timeout=15,
-                                proxies={"http": proxy, "https": proxy})
-            resp.raise_for_status()
-            logging.info("HTML loaded via %s", proxy)
-            return resp.text
-        except Exception:
-            ban_proxy(proxy)
-    return None
-
-
-def _parse_html(html: str) -> list[dict]:
-    """Extract notice rows from the HTML string."""
-    soup   = BeautifulSoup(html, "lxml")
+    """Return raw HTML, racing `RACE_WIDTH` proxies at a time and
+    trying up to `max_tries` proxies in total."""
+    ex = ThreadPoolExecutor(max_workers=RACE_WIDTH)
+    running, tries = {}, 0
+    try:
+        while True:
+            while len(running) < RACE_WIDTH and tries < max_tries:
+                proxy = pick_proxy()
+                if not proxy or proxy in running.values():
+                    break   # pool exhausted, or smaller than the race
+                tries += 1
+                running[ex.submit(_get_via, proxy)] = proxy
+            if not running:
+                return None
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                proxy = running.pop(fut)
+                try:
+                    html = fut.result()
+                except Exception:
+                    _drop_proxy(proxy)
+                    continue
+                report_success(proxy)
+                logging.info("HTML loaded via %s", proxy)
+                return html
+    finally:
+        # losers can't be interrupted mid-request; just stop waiting on them
+        ex.shutdown(wait=False, cancel_futures=True)
+
+
+def _parse_html(html: str, sent=frozenset()) -> list[Notice]:
+    """Extract notice rows from the HTML string, skipping IDs in `sent`."""
+    doc    = lxml.html.fromstring(html)
     cutoff = datetime.utcnow().date() - timedelta(days=LOOKBACK_DAYS)
     notices = []
 
-    for flex in soup.select("div.flex"):
-        left  = flex.select_one("div.leftSection")
-        title_tag = flex.select_one("div.rightSection p.text")
+    for flex in _XP_ROWS(doc):
+        left  = _XP_LEFT(flex)
+        title_tag = _XP_TITLE(flex)
         if not (left and title_tag):
             continue
 
-        m = DATE_RE.search(left.get_text(" "))
+        m = DATE_RE.search(" ".join(left[0].itertext()))
         if not m:
             continue
-        date = dtparse(" ".join(m.groups())).date()
-        if date < cutoff:
+        mon, dd, yy = m.groups()
+        try:
+            d = date(int(yy), MONTHS[mon.title()], int(dd))
+        except (KeyError, ValueError):
+            continue
+        if d < cutoff:
             continue
 
-        title = title_tag.get_text(strip=True)
+        title = "".join(t.strip() for t in title_tag[0].itertext())
         if not title:
             continue
 
-        link_tag = flex.select_one("div.rightSection a[href$='.pdf']")
-        link = link_tag["href"] if link_tag else None
-        uid  = f"main-{date}-{title[:80]}"
-
-        notices.append({
-            "id":    uid,
-            "date":  date,
-            "title": title,
-            "link":  link,
-            "src":   "Main SSC"
-        })
+        uid  = make_id("main", d, title)
+        if uid in sent:
+            continue
+        hrefs = _XP_PDF(flex)
+        link = str(hrefs[0]) if hrefs else None
+
+        notices.append(Notice(
+            id=uid,
+            date=d,
+            title=title,
+            link=link,
+            src="Main SSC",
+        ))
     return notices
 
 
 # ── public API (what main.py calls) ──────────────────────────
-def scrape_main_html() -> list[dict]:
-    """Return list of notices using proxy-based HTML scraping."""
+def scrape_main_html(sent=frozenset()) -> list[Notice]:
+    """Return notices not in `sent` using proxy-based HTML scraping."""
     html = _fetch_html()
     if not html:
         logging.error("All proxies failed for HTML fetch")
         return []
-    return _parse_html(html)
+    return _parse_html(html, sent)
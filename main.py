@@ -3,113 +3,263 @@
 Multi-SSC Monitor – fast proxy/HTML version
 """
 
-import os, re, json, time, logging, requests
-from datetime import datetime, timedelta
-from dateutil.parser import parse as dtparse
+import os, re, time, sqlite3, logging, requests
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from html import escape, unescape
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import html_scraper
+from notice import MONTHS, Notice, make_id
 
 MAIN_SSC_API = ("https://ssc.gov.in/api/public/noticeboard"
                 "?page=0&size=50&sort=createdOn,desc")
 SSC_NR_URL   = "https://sscnr.nic.in/newlook/site/Whatsnew.html"
-DATE_RE_NR   = re.compile(r"\[(\d{1,2})\s+([A-Za-z]{3,9})\s+(\d{4})\]")
+# a whole source line containing a "[dd Mon yyyy]" stamp
+LINE_RE_NR   = re.compile(r"^.*?\[(\d{1,2})[ \t]+([A-Za-z]{3,9})[ \t]+(\d{4})\].*$",
+                          re.MULTILINE)
+STRIP_RE_NR  = re.compile(r"<[^>]+>|\[.*?\]")   # tags and [..] in one pass
 
-STATE_FILE    = "/data/multi_ssc_state.json"
+STATE_DB      = "/data/multi_ssc_state.db"
+STATE_FILE    = "/data/multi_ssc_state.json"   # legacy, imported once
 LOOKBACK_DAYS = 12
+SENT_TTL      = 2 * LOOKBACK_DAYS * 86_400     # s; older IDs can't reappear
+LEGACY_ID_RE  = re.compile(r"(main|nr)-(\d{4}-\d{2}-\d{2})-(.*)", re.DOTALL)
+HASHED_RE     = re.compile(r"[0-9a-f]{16}")
 CHECK_INTERVAL = 300
+TG_MAX_CHARS  = 4000                           # Telegram hard limit is 4096
+TG_SEPARATOR  = "\n\n---\n\n"
+
+# ── shared HTTP sessions (keep-alive across cycles) ──────────
+def _new_session(pool: int) -> requests.Session:
+    s = requests.Session()
+    s.mount("https://", HTTPAdapter(
+        pool_connections=pool, pool_maxsize=2 * pool,
+        max_retries=Retry(total=2, backoff_factor=0.3)))
+    s.headers.update({"User-Agent": "Mozilla/5.0", "Accept": "*/*"})
+    return s
+
+SESSION    = _new_session(4)   # ssc.gov.in API + sscnr.nic.in
+TG_SESSION = _new_session(1)   # api.telegram.org only
+_HTTP_CACHE = {}   # url → {"etag", "last_mod", "body", "dirty"} of the last 200
+
+def fetch_cached(url, timeout):
+    """GET `url` as text, revalidating with ETag/Last-Modified; a 304
+    returns the body from the previous cycle without re-downloading it."""
+    c, hdrs = _HTTP_CACHE.get(url), {}
+    if c and c["etag"]:     hdrs["If-None-Match"] = c["etag"]
+    if c and c["last_mod"]: hdrs["If-Modified-Since"] = c["last_mod"]
+    r = SESSION.get(url, headers=hdrs, timeout=timeout)
+    if r.status_code == 304 and c: return c["body"]
+    r.raise_for_status()
+    etag, last_mod = r.headers.get("ETag"), r.headers.get("Last-Modified")
+    changed = not c or (c["etag"], c["last_mod"]) != (etag, last_mod)
+    _HTTP_CACHE[url] = {"etag": etag, "last_mod": last_mod,
+                        "body": r.text if etag or last_mod else None,
+                        "dirty": changed or c["dirty"]}
+    return r.text
 
 # ── state helpers ────────────────────────────────────────────
+_DB   = None
+_SENT = None   # in-memory mirror of the sent table's IDs
+
 def _ensure_dir(): os.makedirs("/data", exist_ok=True)
-def load_state():
-    _ensure_dir()
-    try: return json.load(open(STATE_FILE))
-    except: return {"main": [], "nr": []}
-def save_state(s): _ensure_dir(); json.dump(s, open(STATE_FILE,"w"), indent=2)
+
+def _import_json_state(db):
+    """Carry the IDs of the old JSON state file over, so nothing is re-sent."""
+    try:
+        with open(STATE_FILE, "rb") as f: st = orjson.loads(f.read())
+    except (OSError, ValueError): return
+    now = int(time.time())
+    db.executemany("INSERT OR IGNORE INTO sent VALUES (?,?,?)",
+                   [(i, src, now) for src in ("main", "nr") for i in st.get(src, [])])
+
+def _rehash_legacy_ids(db):
+    """Rewrite old title-bearing IDs into make_id() form, exactly."""
+    for (old,) in db.execute("SELECT id FROM sent").fetchall():
+        m = LEGACY_ID_RE.fullmatch(old)
+        if not m or HASHED_RE.fullmatch(m[3]): continue
+        new = make_id(m[1], date.fromisoformat(m[2]), m[3])
+        db.execute("UPDATE OR IGNORE sent SET id=? WHERE id=?", (new, old))
+        db.execute("DELETE FROM sent WHERE id=?", (old,))
+
+def state_db():
+    global _DB
+    if _DB is None:
+        _ensure_dir()
+        fresh = not os.path.exists(STATE_DB)
+        _DB = sqlite3.connect(STATE_DB)
+        with _DB:
+            _DB.execute("CREATE TABLE IF NOT EXISTS sent "
+                        "(id TEXT PRIMARY KEY, src TEXT, ts INTEGER)")
+            _DB.execute("CREATE INDEX IF NOT EXISTS sent_ts ON sent (ts)")
+            _DB.execute("CREATE TABLE IF NOT EXISTS http_cache "
+                        "(url TEXT PRIMARY KEY, etag TEXT, last_mod TEXT, body TEXT)")
+            if fresh: _import_json_state(_DB)
+            _rehash_legacy_ids(_DB)
+        for url, etag, last_mod, body in _DB.execute("SELECT * FROM http_cache"):
+            _HTTP_CACHE[url] = {"etag": etag, "last_mod": last_mod,
+                                "body": body, "dirty": False}
+    return _DB
+
+def load_sent(db):
+    """Sent IDs; read from disk once, then kept current by mark_sent."""
+    global _SENT
+    if _SENT is None:
+        _SENT = {i for (i,) in db.execute("SELECT id FROM sent")}
+    return _SENT
+
+def mark_sent(db, n):
+    src = "main" if n.src == "Main SSC" else "nr"
+    db.execute("INSERT OR IGNORE INTO sent VALUES (?,?,?)",
+               (n.id, src, int(time.time())))
+    if _SENT is not None: _SENT.add(n.id)
+
+def save_http_cache(db):
+    """Persist changed validators so a restart can still revalidate."""
+    rows = [(u, c["etag"], c["last_mod"], c["body"])
+            for u, c in _HTTP_CACHE.items() if c["dirty"]]
+    if not rows: return
+    with db:
+        db.executemany("INSERT OR REPLACE INTO http_cache VALUES (?,?,?,?)", rows)
+    for u, *_ in rows: _HTTP_CACHE[u]["dirty"] = False
+
+def prune_sent(db):
+    global _SENT
+    cur = db.execute("DELETE FROM sent WHERE ts < ?", (int(time.time()) - SENT_TTL,))
+    if cur.rowcount: _SENT = None   # rare; reload on the next cycle
 
 # ── Telegram ─────────────────────────────────────────────────
-def send_tg(msg: str) -> bool:
+def send_tg(msg: str) -> bool | None:
+    """True if sent, False if worth retrying later, None if Telegram
+    refused the message itself (a 4xx other than rate limiting)."""
     tok, chat = os.getenv("TELEGRAM_BOT_TOKEN"), os.getenv("TELEGRAM_CHAT_ID")
     if not (tok and chat): return False
     try:
-        requests.post(f"https://api.telegram.org/bot{tok}/sendMessage",
-                      data={"chat_id": chat, "text": msg,
-                            "parse_mode": "HTML",
-                            "disable_web_page_preview": True}, timeout=10)
+        r = TG_SESSION.post(f"https://api.telegram.org/bot{tok}/sendMessage",
+                            data=orjson.dumps({"chat_id": chat, "text": msg,
+                                               "parse_mode": "HTML",
+                                               "disable_web_page_preview": True}),
+                            headers={"Content-Type": "application/json"},
+                            timeout=10)
+        if 400 <= r.status_code < 500 and r.status_code != 429:
+            logging.error("TG refused message → %s %s", r.status_code, r.text)
+            return None
+        r.raise_for_status()
         return True
     except Exception as e:
         logging.error("TG error → %s", e); return False
 
 def fmt(n):
-    icon = "🏛️" if n["src"] == "Main SSC" else "🏢"
-    msg  = f"{icon} New {n['src']} Notice\n\n📅 {n['date']}\n📄 {n['title']}\n\n"
-    if n["link"]: msg += "🔗 Open"
+    icon = "🏛️" if n.src == "Main SSC" else "🏢"
+    msg  = (f"{icon} New {n.src} Notice\n\n"
+            f"📅 {escape(str(n.date))}\n📄 {escape(n.title)}\n\n")   # parse_mode=HTML
+    if n.link: msg += "🔗 Open"
     return msg
 
+def tg_batches(notices):
+    """Yield (text, notices) per message: one source each, ≤ TG_MAX_CHARS."""
+    by_src = {}
+    for n in notices: by_src.setdefault(n.src, []).append(n)
+    for group in by_src.values():
+        parts, batch, size = [], [], 0
+        for n in group:
+            msg = fmt(n)
+            if batch and size + len(TG_SEPARATOR) + len(msg) > TG_MAX_CHARS:
+                yield TG_SEPARATOR.join(parts), batch
+                parts, batch, size = [], [], 0
+            size += len(msg) + (len(TG_SEPARATOR) if parts else 0)
+            parts.append(msg); batch.append(n)
+        if batch: yield TG_SEPARATOR.join(parts), batch
+
+def record_sent(db, batch, ok):
+    """Mark `batch` sent after send_tg returned `ok`. A refused notice is
+    logged and marked anyway, so it can't block every later cycle."""
+    if ok is False: return
+    for n in batch:
+        if ok is None: logging.error("Dropping notice Telegram won't accept → %s", n.id)
+        mark_sent(db, n)
+
 # ── Main SSC API ─────────────────────────────────────────────
-def scrape_main_api():
-    r = requests.get(MAIN_SSC_API, timeout=15,
-                     headers={"User-Agent": "Mozilla/5.0"})
-    r.raise_for_status()
-    data = r.json()
-    cutoff = datetime.utcnow().date() - timedelta(days=LOOKBACK_DAYS)
+def scrape_main_api(sent=frozenset()):
+    data = orjson.loads(fetch_cached(MAIN_SSC_API, 15))
+    cutoff = (datetime.utcnow().date() - timedelta(days=LOOKBACK_DAYS)).isoformat()
     out=[]
     for item in data.get("content", []):
         try:
-            d = datetime.fromisoformat(item["createdOn"][:10]).date()
-            if d < cutoff: break
+            day = item["createdOn"][:10]   # ISO dates compare as strings
+            if day < cutoff: break
+            d = date.fromisoformat(day)
             title = item["title"].strip()
             if not title: continue
+            uid   = make_id("main", d, title)
+            if uid in sent: continue
             link  = f"https://ssc.gov.in{item.get('fileUrl','')}" or None
-            uid   = f"main-{d}-{title[:80]}"
-            out.append({"id":uid,"date":d,"title":title,"link":link,"src":"Main SSC"})
+            out.append(Notice(uid, d, title, link, "Main SSC"))
         except: continue
     return out
 
-def scrape_main():
-    try: return scrape_main_api()
+def scrape_main(sent=frozenset()):
+    try: return scrape_main_api(sent)
     except Exception as e:
         logging.warning("API failed → %s. Falling back to HTML.", e)
-        return html_scraper.scrape_main_html()
+        return html_scraper.scrape_main_html(sent)
 
 # ── SSC NR scraper ───────────────────────────────────────────
-def scrape_nr():
-    html = requests.get(SSC_NR_URL, timeout=25).text
+def scrape_nr(sent=frozenset()):
+    html = fetch_cached(SSC_NR_URL, 25)
     cutoff = datetime.utcnow().date() - timedelta(days=LOOKBACK_DAYS)
     out=[]
-    for line in html.splitlines():
-        m=DATE_RE_NR.search(line)
-        if not m: continue
+    for m in LINE_RE_NR.finditer(html):
         try:
-            d = dtparse(" ".join(m.groups())).date()
+            dd, mon, yy = m.groups()
+            d = date(int(yy), MONTHS[mon[:3].title()], int(dd))
             if d<cutoff: continue
-            title = re.sub(r'\[.*?\]','', re.sub(r'<[^>]+>','', line)).strip()
+            title = STRIP_RE_NR.sub("", m.group()).strip()
             if len(title)<10: continue
-            uid=f"nr-{d}-{title[:80]}"
-            out.append({"id":uid,"date":d,"title":title,
-                        "link":SSC_NR_URL,"src":"SSC NR"})
+            uid=make_id("nr", d, title)   # raw text, so existing IDs hold
+            if uid in sent: continue
+            out.append(Notice(uid, d, unescape(title), SSC_NR_URL, "SSC NR"))
         except: continue
     return out
 
 # ── main loop ────────────────────────────────────────────────
+def _result(fut, name):
+    """A scraper's notices, or [] if it failed; one host down mustn't
+    mute the other."""
+    try: return fut.result()
+    except Exception as e:
+        logging.error("%s scrape failed → %s", name, e); return []
+
 def cycle():
-    st = load_state()
-    sent_main, sent_nr = set(st["main"]), set(st["nr"])
-    main, nr = scrape_main(), scrape_nr()
-    new_main = [n for n in main if n["id"] not in sent_main]
-    new_nr   = [n for n in nr   if n["id"] not in sent_nr]
+    db = state_db()
+    sent = load_sent(db)   # scrapers drop known IDs before building notices
+    with ThreadPoolExecutor(max_workers=2) as ex:   # different hosts, pure I/O
+        f_main, f_nr = ex.submit(scrape_main, sent), ex.submit(scrape_nr, sent)
+        new_main, new_nr = _result(f_main, "Main SSC"), _result(f_nr, "SSC NR")
+    save_http_cache(db)
     logging.info("📈 New notices → Main:%d | NR:%d", len(new_main), len(new_nr))
-    for n in new_main + new_nr:
-        if send_tg(fmt(n)):
-            (sent_main if n["src"]=="Main SSC" else sent_nr).add(n["id"])
-            time.sleep(1)
-    st["main"], st["nr"] = list(sent_main)[-500:], list(sent_nr)[-500:]
-    save_state(st)
+    if not (new_main or new_nr):
+        return   # nothing to record; the table only grows on insert
+    with db:   # one transaction per cycle
+        for i, (msg, batch) in enumerate(tg_batches(new_main + new_nr)):
+            if i: time.sleep(1)   # stay under ~1 msg/s per chat
+            ok = send_tg(msg)
+            if ok is None and len(batch) > 1:   # find the notice it choked on
+                for n in batch:
+                    time.sleep(1)
+                    record_sent(db, [n], send_tg(fmt(n)))
+            else:
+                record_sent(db, batch, ok)
+        prune_sent(db)
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO,
                         format="%(asctime)s %(levelname)s %(message)s")
     if not (os.getenv("TELEGRAM_BOT_TOKEN") and os.getenv("TELEGRAM_CHAT_ID")):
         raise SystemExit("Set TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID")
-    logging.info("🚀 SSC monitor started (proxy + BS4)")
+    logging.info("🚀 SSC monitor started (proxy + lxml)")
     while True:
         try: cycle()
         except Exception as e:
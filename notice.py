@@ -0,0 +1,30 @@
+"""
+notice.py
+──────────────────────────────────────────────────────────────
+The notice record shared by every scraper and the Telegram side.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from hashlib import blake2b
+
+# month abbreviation → number; "September"[:3] works too
+MONTHS = {m: i for i, m in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+     "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1)}
+
+
+@dataclass(slots=True, frozen=True)
+class Notice:
+    id:    str
+    date:  date
+    title: str
+    link:  str | None
+    src:   str          # "Main SSC" or "SSC NR"
+
+
+def make_id(src: str, d: date, title: str) -> str:
+    """Fixed-length notice ID, `<src>-<date>-<16 hex>`. Hashes the same
+    80-char title prefix the old readable IDs embedded."""
+    digest = blake2b(title[:80].encode(), digest_size=8).hexdigest()
+    return f"{src}-{d}-{digest}"
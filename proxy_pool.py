@@ -2,63 +2,324 @@
 proxy_pool.py  –  Light Indian proxy rotator
 """
 
-import re, time, random, threading, logging, requests
+import os, re, time, random, socket, threading, logging, requests
+import orjson
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
 
 SPYS_URL        = "https://spys.one/free-proxy-list/IN/"
 _FETCH_TIMEOUT  = 12      # s
-_TEST_TIMEOUT   = 6       # s
+_CONNECT_TIMEOUT = 2     # s; dead proxies rarely even accept
+_READ_TIMEOUT   = 4       # s; live ones can be slow to answer
 _REFRESH_EVERY  = 3_600   # s
+_RETRY_EMPTY    = 300     # s; first retry for an empty pool, doubling per miss
 _MAX_GOOD       = 40
+_MAX_TEST       = 120     # candidates probed per refresh
 _TEST_URL       = "https://httpbin.org/ip"
+_TEST_TARGET    = "ssc.gov.in:443"          # CONNECT target for raw probes
+_HEALTH_URL     = "https://ssc.gov.in/"
+_HEALTH_EVERY   = 30      # s
+_HEALTH_TIMEOUT = 5       # s
+_HEALTH_WORKERS = 16
+_VERIFY_WORKERS = 64
+_RECHECK_AFTER  = 900     # s; a proxy verified this recently isn't re-probed
+_EARLY_TRIED    = 40      # probes before the pass rate is judged
+_MIN_PASS_RATE  = 0.05    # below this (and < 3 passes) the source is given up on
+_COLD_WAIT      = 30      # s; longest get() waits for a first pool
+_HC_FAILS       = 3       # consecutive failures before a proxy is dropped
+_SCORE_ALPHA    = 0.3     # EMA weight of the latest success/failure
+_CACHE_FILE     = "/data/proxy_pool.json"   # survives restarts, like main's state
 
-_lock, _good, _bad, _last = threading.Lock(), [], set(), 0.0
-IP_RE = re.compile(r"(\d{1,3}(?:\.\d{1,3}){3}):(\d{2,5})")
+_lock, _good, _last = threading.Lock(), deque(), 0.0
+_fails = defaultdict(int)   # proxy → consecutive fetch failures since a success
+_probe_fails = defaultdict(int)   # same, for the prober's own checks
+_score = {}                 # proxy → EMA of success (1.0 until first report)
+_verified_recent = {}        # proxy → time of its last passed probe or check
+_alive = set()   # members of `_good` not banned; banned entries leave lazily
+_ready = threading.Condition(_lock)   # signalled when a refresh finishes
+_refreshing, _prober = False, None
+_empty_runs = 0   # refreshes in a row that found no proxies
+_cache_read = False   # the on-disk pool is only consulted once
+IP_RE = re.compile(rb"(\d{1,3}(?:\.\d{1,3}){3}):(\d{2,5})")   # on raw bytes
+STATUS_RE = re.compile(rb"HTTP/1\.[01] (\d{3})")
+log = logging.getLogger("proxy_pool")
+
+def _new_session() -> requests.Session:
+    # no retries: a probe must fail fast, and a failed table fetch is
+    # simply retried on the next get()
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=_VERIFY_WORKERS,
+                          pool_maxsize=_VERIFY_WORKERS, max_retries=0)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+_session = _new_session()
 
 def _scrape_spys() -> list[str]:
     hdrs = {
         "User-Agent": "Mozilla/5.0",
         "Referer": "https://spys.one/"
     }
-    logging.info("Fetching Indian proxy table …")
-    html = requests.get(SPYS_URL, timeout=_FETCH_TIMEOUT, headers=hdrs).text
-    return [f"http://{ip}:{port}" for ip, port in IP_RE.findall(html)]
+    log.info("Fetching Indian proxy table …")
+    body = _session.get(SPYS_URL, timeout=_FETCH_TIMEOUT, headers=hdrs).content
+    cand = {}   # ordered and de-duplicated
+    for m in IP_RE.finditer(body):   # no need to decode the whole page
+        cand[f"http://{m[1].decode()}:{m[2].decode()}"] = None
+        if len(cand) >= _MAX_TEST:
+            break
+    return list(cand)
+
+def _connect_ok(proxy: str) -> bool | None:
+    """Ask `proxy` for a CONNECT tunnel over a bare socket. True/False
+    on a clear status line, None if the reply can't be read as one."""
+    u = urlsplit(proxy)
+    req = f"CONNECT {_TEST_TARGET} HTTP/1.1\r\nHost: {_TEST_TARGET}\r\n\r\n"
+    try:
+        with socket.create_connection((u.hostname, u.port),
+                                      timeout=_CONNECT_TIMEOUT) as sock:
+            sock.settimeout(_READ_TIMEOUT)
+            sock.sendall(req.encode())
+            head = sock.recv(64)
+    except OSError:
+        return False
+    m = STATUS_RE.match(head)
+    return m[1] == b"200" if m else None
 
 def _is_https_ok(proxy: str) -> bool:
+    ok = _connect_ok(proxy)
+    if ok is not None:
+        return ok
+    # ambiguous reply: fall back to a real request, reading only the head
+    # of httpbin's {"origin": ...} body instead of waiting for all of it
     try:
-        requests.get(_TEST_URL,
-                     proxies={"http": proxy, "https": proxy},
-                     timeout=_TEST_TIMEOUT)
-        return True
+        with _session.get(_TEST_URL, stream=True,
+                          proxies={"http": proxy, "https": proxy},
+                          timeout=(_CONNECT_TIMEOUT, _READ_TIMEOUT)) as r:
+            if r.status_code != 200:
+                return False
+            return b"origin" in r.raw.read(64, decode_content=True)
     except Exception:
         return False
 
-def _refresh():
-    global _good, _bad, _last
-    _last, _bad = time.time(), set()
-    cand = _scrape_spys()
-    logging.info("Scraped %d candidates", len(cand))
-    good = []
-    for p in cand:
-        if _is_https_ok(p):
-            good.append(p)
-            logging.info("Proxy OK: %s", p)
-            if len(good) >= _MAX_GOOD:
+def _verify(cand: list[str]) -> tuple[list[str], bool]:
+    """Probe candidates in parallel; stop once `_MAX_GOOD` have passed.
+    Candidates that passed within `_RECHECK_AFTER` are taken as-is.
+    Also says whether the list looked stale and probing gave up early."""
+    now = time.time()
+    for p, ts in list(_verified_recent.items()):
+        if now - ts > _REFRESH_EVERY:
+            _verified_recent.pop(p, None)   # ban() may race us to it
+    good = [p for p in cand if now - _verified_recent.get(p, 0) < _RECHECK_AFTER]
+    if len(good) >= _MAX_GOOD:
+        return good[:_MAX_GOOD], False
+    known = set(good)
+    ex = ThreadPoolExecutor(max_workers=_VERIFY_WORKERS)
+    futs = {ex.submit(_is_https_ok, p): p for p in cand if p not in known}
+    tried = passed = 0
+    gave_up = False
+    try:
+        for fut in as_completed(futs):
+            tried += 1
+            if fut.result():
+                passed += 1
+                good.append(futs[fut])
+                _verified_recent[futs[fut]] = time.time()
+                if len(good) >= _MAX_GOOD:
+                    break
+            elif (tried >= _EARLY_TRIED and passed < 3
+                  and passed / tried < _MIN_PASS_RATE):
+                log.warning("Only %d/%d proxies passed; proxy list looks "
+                            "stale, giving up on the rest", passed, tried)
+                gave_up = True
                 break
-    _good = good
-    logging.info("Ready proxies: %d", len(_good))
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+    log.info("Probed %d proxies: %d passed, %d reused", tried, passed, len(known))
+    if log.isEnabledFor(logging.DEBUG):   # skip the join unless it's shown
+        log.debug("Proxies OK: %s", ", ".join(good))
+    return good, gave_up
+
+def _refresh():
+    """Build a new pool without holding `_lock`, then swap it in; callers
+    keep drawing from the old pool meanwhile."""
+    global _good, _alive, _fails, _probe_fails, _score, _session
+    global _refreshing, _empty_runs
+    good, gave_up = None, False
+    try:
+        # fresh adapter so pools for dropped proxies don't pile up; the old
+        # one is left to GC since the prober may still be using it
+        _session = _new_session()
+        cand = _scrape_spys()
+        log.info("Scraped %d candidates", len(cand))
+        good, gave_up = _verify(cand)
+        log.info("Ready proxies: %d", len(good))
+    except Exception as e:
+        log.error("Proxy refresh failed → %s", e)
+    finally:
+        with _lock:
+            # a failed, empty or stale refresh keeps the old pool; a stale
+            # one's few passes only top it up
+            swap = bool(good) and not (gave_up and _alive)
+            if swap:
+                _good, _alive = deque(good), set(good)
+                _fails, _probe_fails, _score = defaultdict(int), defaultdict(int), {}
+            elif good is not None and _alive:
+                fresh = [p for p in good if p not in _alive]
+                _good.extend(fresh)
+                _alive.update(fresh)
+                log.warning("Refresh found %d proxies; keeping the %d old ones",
+                            len(good), len(_alive) - len(fresh))
+            _empty_runs = 0 if swap else _empty_runs + 1
+            _refreshing = False
+            _ready.notify_all()
+        if swap:
+            _save_cache(good)   # file I/O stays off the get()/ban() lock
+
+def _read_cache() -> tuple[float, list[str]] | None:
+    """The last verified pool and its time, if still fresh. Reads the file
+    without `_lock`, so a slow /data never stalls get()/ban()."""
+    try:
+        with open(_CACHE_FILE, "rb") as f:
+            saved = orjson.loads(f.read())
+        ts, good = saved["ts"], saved["good"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if not good or time.time() - ts > _REFRESH_EVERY:
+        return None
+    return ts, good
+
+def _warm_start():
+    """Seed the pool from the on-disk cache once, before the first refresh."""
+    global _good, _alive, _last, _cache_read
+    cached = _read_cache()
+    with _lock:
+        if _cache_read:
+            return   # another caller got here first
+        _cache_read = True
+        if cached and not _alive:
+            _last, good = cached
+            _good, _alive = deque(good), set(good)
+            log.info("Loaded %d cached proxies", len(_alive))
+
+def _save_cache(good: list[str]):
+    tmp = _CACHE_FILE + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(_CACHE_FILE), exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps({"ts": time.time(), "good": good}))
+        os.replace(tmp, _CACHE_FILE)
+    except OSError as e:
+        log.warning("Could not save proxy cache → %s", e)
 
 def _ensure():
-    if not _good or time.time() - _last > _REFRESH_EVERY:
-        _refresh()
+    """Start a background refresh if the pool is empty or stale (call
+    with `_lock` held)."""
+    global _refreshing, _last
+    if _refreshing:
+        return
+    if _alive:
+        due = _REFRESH_EVERY
+    else:   # back off instead of re-scraping every prober tick
+        due = min(_RETRY_EMPTY * 2 ** _empty_runs, _REFRESH_EVERY)
+    if time.time() - _last > due:
+        _refreshing, _last = True, time.time()
+        threading.Thread(target=_refresh, name="proxy-refresh",
+                         daemon=True).start()
+
+def _is_alive(proxy: str) -> bool:
+    try:
+        r = _session.head(_HEALTH_URL,
+                          proxies={"http": proxy, "https": proxy},
+                          timeout=_HEALTH_TIMEOUT)
+        return r.status_code < 400   # a 403/5xx for this exit IP is no use
+    except Exception:
+        return False
+
+def _probe_loop():
+    """Background upkeep: ban pooled proxies that stop answering for SSC,
+    and start a refresh once the pool is stale or drained, so callers of
+    get() neither pay a timeout on a dead proxy nor wait on a refresh."""
+    while True:
+        time.sleep(_HEALTH_EVERY)
+        with _lock:
+            _ensure()
+            pool = list(_alive)
+        if not pool:
+            continue
+        with ThreadPoolExecutor(max_workers=_HEALTH_WORKERS) as ex:
+            results = list(zip(pool, ex.map(_is_alive, pool)))
+        # a separate streak: a proxy answering HEAD says nothing about the
+        # notice-board GETs that ban()/report_success() track
+        with _lock:
+            now = time.time()
+            for p, ok in results:
+                if p not in _alive:
+                    continue
+                if ok:
+                    _probe_fails.pop(p, None)
+                    _verified_recent[p] = now   # the next refresh can skip it
+                    continue
+                _probe_fails[p] += 1
+                if _probe_fails[p] >= _HC_FAILS:
+                    _drop(p)
+
+def _start_prober():
+    global _prober
+    if _prober is None:
+        _prober = threading.Thread(target=_probe_loop, name="proxy-prober",
+                                   daemon=True)
+        _prober.start()
+
+def _drop(proxy: str):
+    """Take `proxy` out of the pool and forget its history (call with
+    `_lock` held)."""
+    _alive.discard(proxy)
+    for d in (_fails, _probe_fails, _score, _verified_recent):
+        d.pop(proxy, None)
+    log.info("Banned proxy %s (%d left)", proxy, len(_alive))
 
 # ── public helpers ───────────────────────────────────────────
 def get() -> str | None:
+    if not _cache_read:
+        _warm_start()
     with _lock:
         _ensure()
-        return random.choice(_good) if _good else None
+        _start_prober()
+        # cold start: nothing to serve yet, but don't hang a scrape on it
+        _ready.wait_for(lambda: _alive or not _refreshing, timeout=_COLD_WAIT)
+        skipped = 0
+        while _good:
+            proxy = _good[0]
+            if proxy not in _alive:
+                _good.popleft()   # banned since the last pass
+                continue
+            _good.rotate(-1)   # round-robin: spread load, don't re-pick at once
+            # pass over proxies with a poor record in proportion to it, but
+            # never more than one full lap
+            if skipped >= len(_good) or random.random() < _score.get(proxy, 1.0):
+                return proxy
+            skipped += 1
+        return None
+
+def ban(proxy: str) -> bool:
+    """Record a failure; `proxy` leaves the pool after `_HC_FAILS` in a
+    row, so one transient blip doesn't drain it. True once it has left."""
+    with _lock:
+        if proxy not in _alive:
+            return True
+        _fails[proxy] += 1
+        _score[proxy] = (1 - _SCORE_ALPHA) * _score.get(proxy, 1.0)
+        if _fails[proxy] < _HC_FAILS:
+            return False
+        _drop(proxy)
+        return True
 
-def ban(proxy: str):
+def report_success(proxy: str):
     with _lock:
-        if proxy in _good:
-            _good.remove(proxy)
-            logging.info("Banned proxy %s (%d left)", proxy, len(_good))
+        if proxy not in _alive:
+            return
+        _fails.pop(proxy, None)
+        _score[proxy] = (1 - _SCORE_ALPHA) * _score.get(proxy, 1.0) + _SCORE_ALPHA